@@ -1,11 +1,11 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse
 from pydantic import BaseModel
 import sqlite3
 import json
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import os
 import time
 
@@ -16,6 +16,10 @@ from google.genai import types
 
 # Import our HR agent
 from hr_agent.agent import root_agent
+from hr_agent import usage
+
+import reports
+from static_assets import StaticAssetCache
 
 app = FastAPI(title="HR Agent Message Board", version="1.0.0")
 
@@ -37,11 +41,17 @@ def init_database():
     
     conn.commit()
     conn.close()
+    usage.init_usage_tables()
+    reports.init_reports_table()
     print("✅ Database initialized")
 
 # Initialize database on startup
 init_database()
 
+# Load and precompress static assets once; changed files are reloaded on demand
+static_assets = StaticAssetCache("static")
+static_assets.load()
+
 # Session management
 _session_initialized = False
 _current_session_id = None
@@ -54,6 +64,10 @@ APP_NAME = "hr_agent_app"
 session_service = InMemorySessionService()
 runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
 
+# Scheduled reports run on a worker thread's event loop, so they get their own runner and sessions
+report_session_service = InMemorySessionService()
+report_runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=report_session_service)
+
 async def get_or_create_session(force_new=False):
     """Get or create the session."""
     global _session_initialized, _current_session_id, _current_user_id
@@ -67,7 +81,12 @@ async def get_or_create_session(force_new=False):
     
     if not _session_initialized:
         try:
-            await session_service.create_session(app_name=APP_NAME, user_id=_current_user_id, session_id=_current_session_id)
+            await session_service.create_session(
+                app_name=APP_NAME,
+                user_id=_current_user_id,
+                session_id=_current_session_id,
+                state={"session_id": _current_session_id},  # Lets tools attribute usage to this session
+            )
             print(f"✅ ADK session created: {_current_session_id} for user: {_current_user_id}")
             _session_initialized = True
         except Exception as e:
@@ -193,17 +212,77 @@ async def clear_all_messages():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+# Fixed prompt cost of every model call: system instruction plus tool declarations
+AGENT_OVERHEAD_TOKENS = usage.estimate_agent_overhead(
+    f"{root_agent.instruction}\n{root_agent.description}", root_agent.tools
+)
+
+async def run_agent(user_id: str, session_id: str, text: str, agent_runner: Runner = runner) -> str:
+    """Run one agent turn, recording token usage from every event, and return the final text."""
+    content = types.Content(role='user', parts=[types.Part(text=text)])
+
+    final_response = ""
+    async for event in agent_runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
+        usage.record_token_usage(session_id, root_agent.model, event.usage_metadata)
+        if event.is_final_response() and not final_response:
+            if event.content and event.content.parts:
+                final_response = event.content.parts[0].text or ""
+
+    return final_response
+
+async def run_report_batch(prompt: str):
+    """Run a report prompt in its own session so it never touches the interactive chat."""
+    timestamp = int(time.time())
+    session_id = f"hr_report_{timestamp}"
+    user_id = "hr_reports"
+    await report_session_service.create_session(
+        app_name=APP_NAME,
+        user_id=user_id,
+        session_id=session_id,
+        state={"session_id": session_id}
+    )
+    try:
+        content = await run_agent(user_id, session_id, prompt, agent_runner=report_runner)
+        session = await report_session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        return content, session.state.get("generated_image_urls", [])
+    finally:
+        await report_session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+
+report_scheduler = reports.ReportScheduler(run_report_batch)
+
+@app.on_event("startup")
+async def start_report_scheduler():
+    if reports.REPORTS_ENABLED:
+        report_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_report_scheduler():
+    await report_scheduler.stop()
+
 @app.post("/api/chat")
 async def chat_with_agent(request: ChatRequest):
     """Chat with the HR Agent."""
-    global _current_session_id, _current_user_id  # Declare global at the start of function
-    
     try:
+        # Refuse new turns once the daily budget is spent
+        if usage.daily_budget_exceeded():
+            return {
+                "response": "The daily AI usage budget has been reached. Please try again tomorrow.",
+                "images": [],
+                "budget_exceeded": True
+            }
+
         # Ensure session exists
-        await get_or_create_session()
-        
-        # Clear any existing images at the start of each request
         current_session = await get_or_create_session()
+
+        # Pre-flight check: start fresh before the session runs over its budget or the context window
+        session_reset = False
+        projected_tokens = usage.projected_turn_tokens(current_session.events, request.message, AGENT_OVERHEAD_TOKENS)
+        if usage.session_budget_exceeded(_current_session_id) or projected_tokens > usage.MAX_CONTEXT_TOKENS:
+            print(f"🔄 Session too large (~{projected_tokens} tokens), starting fresh session...")
+            current_session = await get_or_create_session(force_new=True)
+            session_reset = True
+
+        # Clear any existing images at the start of each request
         current_session.state["generated_image_urls"] = []
         
         # Clear session history if it's getting too large (prevent token limit issues)
@@ -211,24 +290,10 @@ async def chat_with_agent(request: ChatRequest):
             current_session.events = current_session.events[-5:]  # Keep last 5
             print("🧹 Cleared old session events to prevent token limit")
         
-        # Create user content 
-        content = types.Content(role='user', parts=[types.Part(text=request.message)])
-        
-        # Run the agent using run_async
-        events = []
-        async for event in runner.run_async(user_id=_current_user_id, session_id=_current_session_id, new_message=content):
-            events.append(event)
-        
-        # Extract the final response
-        final_response = ""
+        # Run the agent and extract the final response
+        final_response = await run_agent(_current_user_id, _current_session_id, request.message)
         current_images = []  # Images for this specific response
         
-        for event in events:
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    final_response = event.content.parts[0].text
-                break
-        
         # Get any images that were generated during this request
         updated_session = await get_or_create_session()
         session_image_urls = updated_session.state.get("generated_image_urls", [])
@@ -239,57 +304,19 @@ async def chat_with_agent(request: ChatRequest):
             updated_session.state["generated_image_urls"] = []
 
         
-        return {
+        result = {
             "response": final_response or "I received your message.",
             "images": current_images  # These are now URLs, not base64
         }
+        if session_reset:
+            result["session_reset"] = True
+            result["notice"] = "This conversation reached its size limit, so a fresh session was started. Earlier messages are no longer in context."
+        return result
     
     except Exception as e:
         print(f"❌ Error in chat endpoint: {e}")
         import traceback
         traceback.print_exc()
-        
-        # If token limit exceeded, start fresh session
-        if "token count" in str(e).lower() and "exceeds" in str(e).lower():
-            try:
-                print("🔄 Token limit exceeded, starting fresh session...")
-                timestamp = int(time.time())
-                _current_session_id = f"hr_session_{timestamp}"
-                _current_user_id = f"hr_user_{timestamp}"
-                await get_or_create_session(force_new=True)
-                
-                # Retry the request with fresh session
-                content = types.Content(role='user', parts=[types.Part(text=request.message)])
-                events = []
-                async for event in runner.run_async(user_id=_current_user_id, session_id=_current_session_id, new_message=content):
-                    events.append(event)
-                
-                final_response = ""
-                for event in events:
-                    if event.is_final_response():
-                        if event.content and event.content.parts:
-                            final_response = event.content.parts[0].text
-                        break
-                
-                updated_session = await get_or_create_session()
-                session_image_urls = updated_session.state.get("generated_image_urls", [])
-                current_images = []
-                
-                if session_image_urls:
-                    current_images = session_image_urls
-                    updated_session.state["generated_image_urls"] = []
-                
-                return {
-                    "response": final_response or "I received your message. (Started fresh session due to size limit)",
-                    "images": current_images
-                }
-            except Exception as retry_error:
-                print(f"❌ Retry also failed: {retry_error}")
-                return {
-                    "response": "I'm having trouble processing your request right now. Please try using the 'New Chat' button to start fresh.",
-                    "images": []
-                }
-        
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/chat/new")
@@ -340,44 +367,85 @@ async def get_chat_history():
         print(f"❌ Error getting chat history: {e}")
         return {"messages": [], "images": []}
 
+@app.get("/api/reports/latest")
+async def get_latest_report():
+    """Return the most recently generated insight report."""
+    try:
+        report = reports.get_latest_report()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if report is None:
+        raise HTTPException(status_code=404, detail="No report has been generated yet")
+    return report
+
+@app.post("/api/reports/run")
+async def run_report_now():
+    """Trigger a report over new messages without waiting for the schedule (admin function)."""
+    if not report_scheduler.trigger():
+        return {"success": False, "message": "A report is already being generated"}
+
+    return {"success": True, "message": "Report generation started"}
+
+@app.get("/api/usage")
+async def get_usage(days: int = Query(7, ge=1, le=365), session_id: Optional[str] = None):
+    """Token, image and cost usage for today, a session (the current one by default) and recent days."""
+    session_id = session_id or _current_session_id
+    try:
+        return {
+            "today": usage.get_daily_usage(),
+            "session": {
+                "session_id": session_id,
+                **usage.get_session_usage(session_id or "")
+            },
+            "history": usage.get_usage_history(days),
+            "budgets": usage.budget_status()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 # Serve generated images first (more specific path)
 app.mount("/images", StaticFiles(directory="generated_images"), name="images")
 
-# Serve static files (HTML, CSS, JS)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Serve static files (HTML, CSS, JS) from the in-memory, precompressed cache
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(path: str, request: Request):
+    """Serve a static asset; fingerprinted URLs get long-lived cache headers."""
+    asset, fingerprinted = static_assets.resolve(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return static_assets.response(request, asset, immutable=fingerprinted)
 
 @app.get("/", response_class=HTMLResponse)
-async def serve_homepage():
+async def serve_homepage(request: Request):
     """Serve the message board frontend."""
-    try:
-        with open("static/index.html", "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse("""
-        <html>
-        <body>
-        <h1>HR Message Board</h1>
-        <p>Frontend not found. Please create static/index.html</p>
-        </body>
-        </html>
-        """)
+    asset = static_assets.get("index.html")
+    if asset is not None:
+        return static_assets.response(request, asset)
+    return HTMLResponse("""
+    <html>
+    <body>
+    <h1>HR Message Board</h1>
+    <p>Frontend not found. Please create static/index.html</p>
+    </body>
+    </html>
+    """)
 
 @app.get("/chat", response_class=HTMLResponse)
-async def serve_chat():
+async def serve_chat(request: Request):
     """Serve the HR chat interface."""
-    try:
-        with open("static/chat.html", "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse("""
-        <html>
-        <body>
-        <h1>HR Chat Interface</h1>
-        <p>Chat interface not found. Please create static/chat.html</p>
-        <p><a href="/">← Back to Message Board</a></p>
-        </body>
-        </html>
-        """)
+    asset = static_assets.get("chat.html")
+    if asset is not None:
+        return static_assets.response(request, asset)
+    return HTMLResponse("""
+    <html>
+    <body>
+    <h1>HR Chat Interface</h1>
+    <p>Chat interface not found. Please create static/chat.html</p>
+    <p><a href="/">← Back to Message Board</a></p>
+    </body>
+    </html>
+    """)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,2 @@
+# Having a conftest.py at the repository root puts the root on sys.path, so
+# plain `pytest` can import app modules such as reports and static_assets.
@@ -1 +1,9 @@
-from . import agent
\ No newline at end of file
+import importlib
+
+
+def __getattr__(name):
+    # The agent pulls in ADK and Vertex AI; load it on first access so helpers
+    # such as hr_agent.usage can be imported without the cloud stack.
+    if name == "agent":
+        return importlib.import_module(".agent", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,12 +6,16 @@ import time
 
 from vertexai.preview.vision_models import ImageGenerationModel
 
+from .usage import fit_messages, image_budget_remaining, record_image_usage
+
 # --- GLOBAL CONFIGURATION (loaded once) ---
 # These are loaded from the .env file by the ADK runner.
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1") # Default if not set
 DATABASE_FILE = "messages.db"
 IMAGES_DIR = "generated_images"
+IMAGE_MODEL = "imagen-4.0-generate-preview-06-06"
+IMAGES_PER_CALL = 2
 
 # Ensure images directory exists
 os.makedirs(IMAGES_DIR, exist_ok=True)
@@ -27,20 +31,29 @@ def create_image(tool_context, prompt: str) -> dict:
         print(f"ERROR: {error_msg}")
         return {"error": error_msg}
 
-    print(f"Generating 2 images with prompt: '{prompt}' in project {PROJECT_ID} and location {LOCATION}")
+    # 2. Refuse generation once the daily image budget is spent
+    remaining = image_budget_remaining()
+    if remaining == 0:
+        error_msg = "Daily image generation budget reached. Describe the poster in text instead; images can be generated again tomorrow."
+        print(f"WARNING: {error_msg}")
+        return {"error": error_msg}
+    number_of_images = IMAGES_PER_CALL if remaining < 0 else min(IMAGES_PER_CALL, remaining)
+
+    print(f"Generating {number_of_images} images with prompt: '{prompt}' in project {PROJECT_ID} and location {LOCATION}")
 
     try:
-        # 2. Initialize the Vertex AI model
-        model = ImageGenerationModel.from_pretrained("imagen-4.0-generate-preview-06-06")
+        # 3. Initialize the Vertex AI model
+        model = ImageGenerationModel.from_pretrained(IMAGE_MODEL)
 
-        # 3. Generate images
+        # 4. Generate images
         response = model.generate_images(
             prompt=prompt,
-            number_of_images=2,
+            number_of_images=number_of_images,
             aspect_ratio="3:4",
         )
+        record_image_usage(tool_context.state.get("session_id"), IMAGE_MODEL, len(response.images))
 
-        # 4. Process response and save images locally
+        # 5. Process response and save images locally
         image_urls = []
         timestamp = int(time.time())
         
@@ -57,7 +70,7 @@ def create_image(tool_context, prompt: str) -> dict:
             image_urls.append(image_url)
             print(f"Saved image to {image_path}")
 
-        # 5. Store only the URLs in session state
+        # 6. Store only the URLs in session state
         tool_context.state["generated_image_urls"] = image_urls
         tool_context.state["last_image_generation"] = prompt
 
@@ -100,7 +113,7 @@ def list_submitted_messages() -> str:
             return json.dumps([{"content": "No messages have been submitted yet."}])
         
         print(f"Loaded {len(messages)} messages from database")
-        return json.dumps(messages)
+        return json.dumps(fit_messages(messages))
         
     except Exception as e:
         error_message = f"Error loading messages from database: {e}"
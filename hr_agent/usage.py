@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+DATABASE_FILE = "messages.db"
+
+# --- PRICING (USD) ---
+# Per million tokens for text models, per image for Imagen.
+MODEL_PRICES = {
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+}
+IMAGE_PRICES = {
+    "imagen-4.0-generate-preview-06-06": 0.04,
+}
+
+# --- BUDGETS ---
+# 0 disables a budget. Soft limits trigger degraded behaviour before the hard limit is hit.
+DAILY_TOKEN_BUDGET = int(os.getenv("HR_DAILY_TOKEN_BUDGET", "2000000"))
+SESSION_TOKEN_BUDGET = int(os.getenv("HR_SESSION_TOKEN_BUDGET", "200000"))
+DAILY_IMAGE_BUDGET = int(os.getenv("HR_DAILY_IMAGE_BUDGET", "40"))
+DAILY_COST_BUDGET_USD = float(os.getenv("HR_DAILY_COST_BUDGET_USD", "5.0"))
+SOFT_BUDGET_RATIO = float(os.getenv("HR_SOFT_BUDGET_RATIO", "0.8"))
+
+# --- PRE-FLIGHT LIMITS ---
+# Requests are estimated before they are sent so the context window is never exceeded.
+MAX_CONTEXT_TOKENS = int(os.getenv("HR_MAX_CONTEXT_TOKENS", "800000"))
+MAX_MESSAGES_TOKENS = int(os.getenv("HR_MAX_MESSAGES_TOKENS", "100000"))
+DIGEST_MESSAGE_COUNT = 200
+DIGEST_MESSAGE_CHARS = 280
+# Parameter schema and wrapping sent with each tool declaration, beyond its name and docstring.
+TOOL_DECLARATION_TOKENS = 200
+
+_tables_ready = False
+
+
+def init_usage_tables():
+    """Create the usage table if it does not exist yet."""
+    global _tables_ready
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usage_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            kind TEXT NOT NULL,
+            model TEXT,
+            prompt_tokens INTEGER DEFAULT 0,
+            output_tokens INTEGER DEFAULT 0,
+            total_tokens INTEGER DEFAULT 0,
+            images INTEGER DEFAULT 0,
+            cost_usd REAL DEFAULT 0,
+            day TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_day ON usage_events (day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_usage_session ON usage_events (session_id)")
+
+    conn.commit()
+    conn.close()
+    _tables_ready = True
+
+
+def _connect():
+    if not _tables_ready:
+        init_usage_tables()
+    return sqlite3.connect(DATABASE_FILE)
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for pre-flight checks."""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def estimate_events_tokens(events) -> int:
+    """Estimate how many tokens a session's event history adds to the next model call."""
+    total = 0
+    for event in events:
+        content = getattr(event, "content", None)
+        if not content or not content.parts:
+            continue
+        for part in content.parts:
+            if getattr(part, "text", None):
+                total += estimate_tokens(part.text)
+            elif getattr(part, "function_response", None):
+                total += estimate_tokens(json.dumps(part.function_response.response, default=str))
+            elif getattr(part, "function_call", None):
+                total += estimate_tokens(json.dumps(part.function_call.args, default=str))
+    return total
+
+
+def estimate_agent_overhead(instruction: str, tools: list) -> int:
+    """Tokens the system instruction and tool declarations add to every model call."""
+    total = estimate_tokens(instruction)
+    for tool in tools:
+        total += estimate_tokens(getattr(tool, "__name__", "") + (getattr(tool, "__doc__", None) or ""))
+        total += TOOL_DECLARATION_TOKENS
+    return total
+
+
+def messages_headroom_tokens() -> int:
+    """Upper bound on what list_submitted_messages can add to a turn: the full list or its digest."""
+    digest_entry = json.dumps({"content": "x" * DIGEST_MESSAGE_CHARS + "…"}) + ", "
+    digest_tokens = DIGEST_MESSAGE_COUNT * estimate_tokens(digest_entry) + 100
+    return max(MAX_MESSAGES_TOKENS, digest_tokens)
+
+
+def projected_turn_tokens(events, message: str, overhead_tokens: int) -> int:
+    """
+    Upper estimate of the prompt for the next turn: agent overhead, session
+    history, the new message and room for this turn's message listing.
+    """
+    return (overhead_tokens + estimate_events_tokens(events)
+            + estimate_tokens(message) + messages_headroom_tokens())
+
+
+def token_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    prices = MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices["input"] + output_tokens * prices["output"]) / 1_000_000
+
+
+def record_token_usage(session_id: str, model: str, usage_metadata) -> int:
+    """
+    Persist the usage metadata attached to a model response.
+    Returns the total number of tokens recorded.
+    """
+    if usage_metadata is None:
+        return 0
+
+    prompt_tokens = getattr(usage_metadata, "prompt_token_count", None) or 0
+    output_tokens = getattr(usage_metadata, "candidates_token_count", None) or 0
+    total_tokens = getattr(usage_metadata, "total_token_count", None) or (prompt_tokens + output_tokens)
+    if not total_tokens:
+        return 0
+
+    try:
+        conn = _connect()
+        conn.execute(
+            """
+            INSERT INTO usage_events
+                (session_id, kind, model, prompt_tokens, output_tokens, total_tokens, cost_usd, day)
+            VALUES (?, 'llm', ?, ?, ?, ?, ?, ?)
+            """,
+            (session_id, model, prompt_tokens, output_tokens, total_tokens,
+             token_cost(model, prompt_tokens, output_tokens), _today()),
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Failed to record token usage: {e}")
+
+    return total_tokens
+
+
+def record_image_usage(session_id: str, model: str, images: int):
+    """Persist the number of images generated by an Imagen call."""
+    try:
+        conn = _connect()
+        conn.execute(
+            """
+            INSERT INTO usage_events (session_id, kind, model, images, cost_usd, day)
+            VALUES (?, 'image', ?, ?, ?, ?)
+            """,
+            (session_id, model, images, images * IMAGE_PRICES.get(model, 0.0), _today()),
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Failed to record image usage: {e}")
+
+
+def _totals(where: str, params: tuple) -> dict:
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(output_tokens), 0),
+               COALESCE(SUM(total_tokens), 0), COALESCE(SUM(images), 0),
+               COALESCE(SUM(cost_usd), 0)
+        FROM usage_events WHERE {where}
+        """,
+        params,
+    )
+    row = cursor.fetchone()
+    conn.close()
+    return {
+        "prompt_tokens": row[0],
+        "output_tokens": row[1],
+        "total_tokens": row[2],
+        "images": row[3],
+        "cost_usd": round(row[4], 6),
+    }
+
+
+def get_daily_usage(day: str = None) -> dict:
+    return _totals("day = ?", (day or _today(),))
+
+
+def get_session_usage(session_id: str) -> dict:
+    return _totals("session_id = ?", (session_id,))
+
+
+def get_usage_history(days: int = 7) -> list:
+    """Per-day totals for the most recent days that recorded usage."""
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT day, SUM(prompt_tokens), SUM(output_tokens), SUM(total_tokens),
+               SUM(images), SUM(cost_usd)
+        FROM usage_events
+        GROUP BY day
+        ORDER BY day DESC
+        LIMIT ?
+        """,
+        (days,),
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {
+            "day": row[0],
+            "prompt_tokens": row[1],
+            "output_tokens": row[2],
+            "total_tokens": row[3],
+            "images": row[4],
+            "cost_usd": round(row[5], 6),
+        }
+        for row in rows
+    ]
+
+
+def _over(used: float, budget: float, ratio: float = 1.0) -> bool:
+    return budget > 0 and used >= budget * ratio
+
+
+def daily_budget_exceeded(daily: dict = None) -> bool:
+    """True once the daily token or cost budget is spent; chat turns are refused."""
+    daily = daily or get_daily_usage()
+    return (_over(daily["total_tokens"], DAILY_TOKEN_BUDGET)
+            or _over(daily["cost_usd"], DAILY_COST_BUDGET_USD))
+
+
+def daily_budget_low(daily: dict = None) -> bool:
+    """True once the soft daily threshold is crossed; tools switch to cheaper behaviour."""
+    daily = daily or get_daily_usage()
+    return (_over(daily["total_tokens"], DAILY_TOKEN_BUDGET, SOFT_BUDGET_RATIO)
+            or _over(daily["cost_usd"], DAILY_COST_BUDGET_USD, SOFT_BUDGET_RATIO))
+
+
+def session_budget_exceeded(session_id: str) -> bool:
+    return _over(get_session_usage(session_id)["total_tokens"], SESSION_TOKEN_BUDGET)
+
+
+def image_budget_remaining(daily: dict = None) -> int:
+    """Images that may still be generated today, or -1 when unlimited."""
+    daily = daily or get_daily_usage()
+    if _over(daily["cost_usd"], DAILY_COST_BUDGET_USD, SOFT_BUDGET_RATIO):
+        return 0
+    if DAILY_IMAGE_BUDGET <= 0:
+        return -1
+    return max(DAILY_IMAGE_BUDGET - daily["images"], 0)
+
+
+def budget_status() -> dict:
+    daily = get_daily_usage()
+    return {
+        "daily_token_budget": DAILY_TOKEN_BUDGET,
+        "session_token_budget": SESSION_TOKEN_BUDGET,
+        "daily_image_budget": DAILY_IMAGE_BUDGET,
+        "daily_cost_budget_usd": DAILY_COST_BUDGET_USD,
+        "soft_budget_ratio": SOFT_BUDGET_RATIO,
+        "daily_budget_exceeded": daily_budget_exceeded(daily),
+        "daily_budget_low": daily_budget_low(daily),
+        "images_remaining_today": image_budget_remaining(daily),
+    }
+
+
+def digest_messages(messages: list) -> list:
+    """
+    Shrink a message list for the model when the full list is too large or the
+    budget is running low: keep the most recent messages, truncated.
+    """
+    recent = messages[-DIGEST_MESSAGE_COUNT:]
+    digest = [
+        {"content": m["content"] if len(m["content"]) <= DIGEST_MESSAGE_CHARS
+         else m["content"][:DIGEST_MESSAGE_CHARS] + "…"}
+        for m in recent
+    ]
+    omitted = len(messages) - len(recent)
+    if omitted > 0:
+        digest.insert(0, {"content": f"[Digest: {omitted} older messages omitted; showing the {len(recent)} most recent.]"})
+    return digest
+
+
+def fit_messages(messages: list) -> list:
+    """Return the messages unchanged, or a digest when they would blow the token or budget limits."""
+    if daily_budget_low():
+        print("⚠️ Daily budget running low, sending message digest")
+        return digest_messages(messages)
+    if estimate_tokens(json.dumps(messages)) > MAX_MESSAGES_TOKENS:
+        print("⚠️ Messages exceed pre-flight token limit, sending message digest")
+        return digest_messages(messages)
+    return messages
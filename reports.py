@@ -0,0 +1,327 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from hr_agent import usage
+
+DATABASE_FILE = "messages.db"
+
+# --- SCHEDULE ---
+# Reports run every REPORT_INTERVAL_HOURS, at the first REPORT_HOUR (UTC) after they are due.
+REPORT_INTERVAL_HOURS = float(os.getenv("HR_REPORT_INTERVAL_HOURS", "168"))
+REPORT_HOUR = int(os.getenv("HR_REPORT_HOUR", "2"))
+REPORT_IMAGES = os.getenv("HR_REPORT_IMAGES", "true").lower() in ("1", "true", "yes")
+REPORTS_ENABLED = os.getenv("HR_REPORTS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Runs a prompt in a fresh agent session and returns (response text, image URLs).
+# It is awaited on a worker thread's event loop, never on the server's.
+BatchRunner = Callable[[str], Awaitable[Tuple[str, List[str]]]]
+
+
+def init_reports_table():
+    """Create the reports table if it does not exist yet."""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            content TEXT,
+            images TEXT DEFAULT '[]',
+            first_message_id INTEGER,
+            last_message_id INTEGER,
+            message_count INTEGER DEFAULT 0,
+            error TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _row_to_report(row) -> dict:
+    return {
+        "id": row[0],
+        "status": row[1],
+        "content": row[2],
+        "images": json.loads(row[3] or "[]"),
+        "first_message_id": row[4],
+        "last_message_id": row[5],
+        "message_count": row[6],
+        "error": row[7],
+        "created_at": row[8],
+    }
+
+
+def get_latest_report() -> Optional[dict]:
+    """The most recent successfully generated report."""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, status, content, images, first_message_id, last_message_id,
+               message_count, error, created_at
+        FROM reports
+        WHERE status = 'completed'
+        ORDER BY id DESC
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    conn.close()
+    return _row_to_report(row) if row else None
+
+
+def get_last_run_time() -> Optional[datetime]:
+    """
+    When the scheduler last ran to completion. Failed or skipped runs are
+    ignored so they are retried at the next off-peak hour.
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT created_at FROM reports
+        WHERE status IN ('completed', 'no_changes')
+        ORDER BY id DESC
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    conn.close()
+    return datetime.fromisoformat(row[0]) if row else None
+
+
+def get_checkpoint() -> int:
+    """Id of the last message covered by a completed report (0 if none)."""
+    latest = get_latest_report()
+    if latest is None:
+        return 0
+    return latest["last_message_id"] or 0
+
+
+def fetch_messages_since(last_message_id: int) -> List[dict]:
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, content, created_at FROM messages WHERE id > ? ORDER BY id ASC",
+        (last_message_id,),
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    return [{"id": row[0], "content": row[1], "created_at": row[2]} for row in rows]
+
+
+def save_report(status: str, content: str = None, images: List[str] = None,
+                messages: List[dict] = None, error: str = None) -> int:
+    messages = messages or []
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO reports
+            (status, content, images, first_message_id, last_message_id, message_count, error, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            status,
+            content,
+            json.dumps(images or []),
+            messages[0]["id"] if messages else None,
+            messages[-1]["id"] if messages else None,
+            len(messages),
+            error,
+            _now().isoformat(),
+        ),
+    )
+    report_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return report_id
+
+
+def report_period() -> str:
+    """How the report interval reads in the prompt, e.g. 'weekly' or '3-day'."""
+    if REPORT_INTERVAL_HOURS == 24:
+        return "daily"
+    if REPORT_INTERVAL_HOURS == 168:
+        return "weekly"
+    if REPORT_INTERVAL_HOURS % 24 == 0:
+        return f"{REPORT_INTERVAL_HOURS / 24:g}-day"
+    return f"{REPORT_INTERVAL_HOURS:g}-hour"
+
+
+def take_chunk(messages: List[dict]) -> List[dict]:
+    """
+    Leading messages that fit in one prompt (MAX_MESSAGES_TOKENS). Always at
+    least one, so the backlog keeps moving.
+    """
+    chunk = []
+    tokens = 0
+    for message in messages:
+        message_tokens = usage.estimate_tokens(json.dumps({"content": message["content"]}))
+        if chunk and tokens + message_tokens > usage.MAX_MESSAGES_TOKENS:
+            break
+        chunk.append(message)
+        tokens += message_tokens
+    return chunk
+
+
+def build_report_prompt(messages: List[dict], previous_report: Optional[dict], with_images: bool,
+                        remaining: int = 0) -> str:
+    """Prompt for an incremental report over the messages submitted since the last one."""
+    payload = [{"content": m["content"]} for m in messages]
+
+    prompt = (
+        f"Write the {report_period()} 'state of feedback' report for HR managers.\n"
+        f"Below are the {len(messages)} worker messages submitted since the last report. "
+        "They are already provided, so do NOT call list_submitted_messages.\n"
+    )
+    if remaining:
+        prompt += f"{remaining} newer messages will be covered in a follow-up report.\n"
+    prompt += (
+        "Structure the report as:\n"
+        "1. Summary of this period's feedback\n"
+        "2. Recurring themes and how they changed since the previous report\n"
+        "3. Recommended actions\n"
+        "4. Poster suggestions (topic and key message for each)\n"
+    )
+    if previous_report and previous_report.get("content"):
+        prompt += f"\nPrevious report for context:\n{previous_report['content']}\n"
+    prompt += f"\nNew messages:\n{json.dumps(payload)}\n"
+    if with_images:
+        prompt += "\nFinally, call create_image once to create a poster for the most pressing issue.\n"
+    return prompt
+
+
+def _slot(moment: datetime) -> datetime:
+    """The latest REPORT_HOUR boundary at or before the given moment."""
+    slot = moment.replace(hour=REPORT_HOUR, minute=0, second=0, microsecond=0)
+    if slot > moment:
+        slot -= timedelta(days=1)
+    return slot
+
+
+def next_run_time(last_run: Optional[datetime], now: datetime) -> datetime:
+    """
+    First off-peak hour at or after the moment the next report is due. The
+    interval counts from the slot the last run belonged to, not from when it
+    finished, so a slow run does not push the schedule back a day.
+    """
+    due = now if last_run is None else max(now, _slot(last_run) + timedelta(hours=REPORT_INTERVAL_HOURS))
+    candidate = due.replace(hour=REPORT_HOUR, minute=0, second=0, microsecond=0)
+    if candidate < due:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+class ReportScheduler:
+    """Generates insight reports in the background, off the interactive request path."""
+
+    def __init__(self, run_batch: BatchRunner):
+        self.run_batch = run_batch
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._manual_task: Optional[asyncio.Task] = None
+        self._cancelled = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def run_once(self) -> Optional[int]:
+        """
+        Generate reports over messages since the last checkpoint, one chunk at a
+        time so every message is sent in full. Returns the last report id.
+
+        The work runs on a worker thread with its own event loop, so sync tools
+        such as create_image and the SQLite writes never block the server loop.
+        """
+        async with self._lock:
+            self._cancelled.clear()
+            future = asyncio.get_running_loop().run_in_executor(None, asyncio.run, self._run_batches())
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted; stop it after the current chunk.
+                self._cancelled.set()
+                await future
+                raise
+
+    async def _run_batches(self) -> Optional[int]:
+        messages = fetch_messages_since(get_checkpoint())
+        if not messages:
+            print("📭 No new messages since last report")
+            return save_report("no_changes")
+
+        report_id = None
+        while messages and not self._cancelled.is_set():
+            if usage.daily_budget_low():
+                print("⚠️ Skipping report: daily usage budget is running low")
+                return save_report("skipped", error="Daily usage budget running low")
+
+            chunk = take_chunk(messages)
+            messages = messages[len(chunk):]
+            # Only the report covering the newest messages gets a poster.
+            with_images = not messages and REPORT_IMAGES and usage.image_budget_remaining() != 0
+            prompt = build_report_prompt(chunk, get_latest_report(), with_images, remaining=len(messages))
+
+            print(f"📊 Generating report over {len(chunk)} new messages ({len(messages)} left)...")
+            try:
+                content, images = await self.run_batch(prompt)
+            except Exception as e:
+                print(f"❌ Report generation failed: {e}")
+                return save_report("failed", messages=chunk, error=str(e))
+
+            report_id = save_report("completed", content=content, images=images, messages=chunk)
+            print(f"✅ Report {report_id} generated with {len(images)} images")
+
+        return report_id
+
+    async def _loop(self):
+        while True:
+            run_at = next_run_time(get_last_run_time(), _now())
+            print(f"🗓️ Next report scheduled for {run_at.isoformat()}")
+            await asyncio.sleep(max((run_at - _now()).total_seconds(), 0))
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"❌ Report scheduler error: {e}")
+                await asyncio.sleep(60)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Manual report run failed: {task.exception()}")
+
+    def trigger(self) -> bool:
+        """
+        Start a run immediately in the background, outside the schedule.
+        Returns False if a run is already in progress or queued.
+        """
+        if self.running or (self._manual_task is not None and not self._manual_task.done()):
+            return False
+        self._manual_task = asyncio.create_task(self.run_once())
+        self._manual_task.add_done_callback(self._log_failure)
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        for task in (self._task, self._manual_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass  # Manual run failures are already logged by _log_failure
+        self._task = None
+        self._manual_task = None
@@ -0,0 +1,260 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Brotli is optional; without it assets are served gzip-compressed or as-is.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Pages and un-fingerprinted URLs are cached but always revalidated via ETag.
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+MIN_COMPRESS_SIZE = 512
+
+_FINGERPRINT_RE = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$")
+
+
+class StaticAsset:
+    """A static file held in memory together with its precompressed variants."""
+
+    def __init__(self, name: str, path: str, body: bytes, mtime: float):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/"):
+            self.media_type += "; charset=utf-8"
+        self.fingerprint = hashlib.sha256(body).hexdigest()[:12]
+
+        # encoding -> (body, etag)
+        self.variants: Dict[str, tuple] = {"identity": (body, f'"{self.fingerprint}"')}
+
+        if len(body) >= MIN_COMPRESS_SIZE and self.media_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.variants["gzip"] = (gzipped, f'"{self.fingerprint}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = (compressed, f'"{self.fingerprint}-br"')
+
+    @property
+    def url_name(self) -> str:
+        """File name with the content hash inserted before the extension."""
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.fingerprint}{ext}"
+
+    def etags(self):
+        return {etag for _, etag in self.variants.values()}
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {encoding: quality}."""
+    accepted = {}
+    for item in header.split(","):
+        parts = [p.strip() for p in item.split(";")]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[parts[0].lower()] = quality
+    return accepted
+
+
+class StaticAssetCache:
+    """
+    Loads every file under a directory once, precompresses it and serves it with
+    content negotiation, ETags and long-lived caching for fingerprinted URLs.
+    Files are re-read only when their modification time changes.
+    """
+
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self._assets: Dict[str, StaticAsset] = {}
+
+    def load(self):
+        """Read and precompress all assets in the directory."""
+        self._assets = {}
+        if not os.path.isdir(self.directory):
+            print(f"⚠️ Static directory {self.directory} not found")
+            return
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                self._load_asset(name)
+        # HTML is rewritten last so every referenced asset already has its fingerprint.
+        self._refresh_pages()
+        print(f"✅ Loaded {len(self._assets)} static assets from {self.directory}")
+
+    def _load_asset(self, name: str) -> Optional[StaticAsset]:
+        path = os.path.join(self.directory, name)
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "rb") as f:
+                body = f.read()
+        except (FileNotFoundError, IsADirectoryError, PermissionError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️ Cannot read static asset {name}: {e}")
+            self._assets.pop(name, None)
+            return None
+
+        if name.endswith(".html"):
+            try:
+                body = self._rewrite_urls(body.decode("utf-8")).encode("utf-8")
+            except UnicodeDecodeError:
+                print(f"⚠️ {name} is not UTF-8, serving it without fingerprinted URLs")
+
+        asset = StaticAsset(name, path, body, mtime)
+        self._assets[name] = asset
+        return asset
+
+    def _rewrite_urls(self, html: str) -> str:
+        """Point references to known static assets at their fingerprinted URLs."""
+        for name, asset in self._assets.items():
+            if self._is_page(asset):
+                continue
+            # Only whole URLs: quoted, optionally followed by a query string or fragment.
+            pattern = re.compile(r"(?<=[\"'])" + re.escape(f"{self.url_prefix}/{name}") + r"(?=[\"'?#])")
+            html = pattern.sub(self.url_for(name), html)
+        return html
+
+    @staticmethod
+    def _is_page(asset: StaticAsset) -> bool:
+        return asset.media_type.startswith("text/html")
+
+    def _refresh_pages(self):
+        """Re-read HTML pages so their asset references pick up new fingerprints."""
+        for other in list(self._assets.values()):
+            if self._is_page(other):
+                self._load_asset(other.name)
+
+    def _sync_assets(self) -> bool:
+        """Reload non-page assets that changed or vanished on disk; True if any did."""
+        changed = False
+        for name, asset in list(self._assets.items()):
+            if self._is_page(asset):
+                continue
+            try:
+                mtime = os.stat(asset.path).st_mtime
+            except OSError:
+                self._assets.pop(name, None)
+                changed = True
+                continue
+            if mtime != asset.mtime:
+                print(f"🔄 Reloading changed static asset: {name}")
+                self._load_asset(name)
+                changed = True
+        return changed
+
+    def _is_servable(self, name: str) -> bool:
+        """True if the name is a normalized path to a regular file inside the static directory."""
+        if os.path.normpath(name).replace(os.sep, "/") != name:
+            return False
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, name))
+        return path.startswith(root + os.sep) and os.path.isfile(path)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        """
+        Return the cached asset, reloading it if the file changed on disk and
+        loading it if it was added after startup. Pages also pick up changes to
+        any asset they may reference, so they never point at a stale fingerprint.
+        """
+        asset = self._assets.get(name)
+        if asset is None:
+            if not self._is_servable(name):
+                return None
+            print(f"➕ Loading new static asset: {name}")
+            asset = self._load_asset(name)
+            if asset is not None and not self._is_page(asset):
+                self._refresh_pages()
+            return asset
+
+        if self._is_page(asset) and self._sync_assets():
+            self._refresh_pages()
+            return self._assets.get(name)
+
+        try:
+            mtime = os.stat(asset.path).st_mtime
+        except OSError:
+            self._assets.pop(name, None)
+            return None
+        if mtime != asset.mtime:
+            print(f"🔄 Reloading changed static asset: {name}")
+            asset = self._load_asset(name)
+            if asset is not None and not self._is_page(asset):
+                self._refresh_pages()
+        return asset
+
+    def url_for(self, name: str) -> str:
+        """Fingerprinted URL for an asset, or the plain URL if it is unknown."""
+        asset = self._assets.get(name)
+        if asset is None:
+            return f"{self.url_prefix}/{name}"
+        return f"{self.url_prefix}/{asset.url_name}"
+
+    def resolve(self, url_name: str):
+        """
+        Map a requested path to (asset, fingerprinted). Fingerprinted names only
+        count as such when the hash matches the current content.
+        """
+        asset = self.get(url_name)
+        if asset is not None:
+            return asset, False
+        match = _FINGERPRINT_RE.match(url_name)
+        if match:
+            asset = self.get(match.group("stem") + match.group("ext"))
+            if asset is not None:
+                return asset, asset.fingerprint == match.group("hash")
+        return None, False
+
+    def response(self, request: Request, asset: StaticAsset, immutable: bool = False) -> Response:
+        """Build a negotiated response for the asset, or a 304 if the client copy is current."""
+        cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and accepted.get(candidate, 0) > 0:
+                encoding = candidate
+                break
+        body, etag = asset.variants[encoding]
+
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in client_tags or client_tags & asset.etags():
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,150 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import reports
+from hr_agent import usage
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "messages.db")
+    monkeypatch.setattr(reports, "DATABASE_FILE", db_file)
+    monkeypatch.setattr(usage, "DATABASE_FILE", db_file)
+    monkeypatch.setattr(usage, "_tables_ready", False)
+    monkeypatch.setattr(reports, "REPORT_IMAGES", False)
+
+    conn = sqlite3.connect(db_file)
+    conn.execute("""
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+    reports.init_reports_table()
+    return db_file
+
+
+def add_messages(db_file, contents):
+    conn = sqlite3.connect(db_file)
+    conn.executemany("INSERT INTO messages (content) VALUES (?)", [(c,) for c in contents])
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize("interval_hours", [168, 24])
+def test_schedule_does_not_drift_when_runs_finish_after_the_slot(monkeypatch, interval_hours):
+    monkeypatch.setattr(reports, "REPORT_HOUR", 2)
+    monkeypatch.setattr(reports, "REPORT_INTERVAL_HOURS", interval_hours)
+
+    run_at = reports.next_run_time(None, utc(2026, 10, 19, 1, 0))
+    assert run_at == utc(2026, 10, 19, 2, 0)
+
+    for cycle in range(1, 5):
+        # The run finishes a minute and a half after its slot.
+        finished = run_at + timedelta(minutes=1, seconds=30)
+        run_at = reports.next_run_time(finished, finished)
+        assert run_at == utc(2026, 10, 19, 2, 0) + timedelta(hours=interval_hours * cycle)
+
+
+def test_first_run_waits_for_next_off_peak_hour(monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_HOUR", 2)
+    assert reports.next_run_time(None, utc(2026, 10, 19, 14, 0)) == utc(2026, 10, 20, 2, 0)
+
+
+def test_overdue_report_runs_at_next_off_peak_hour(monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_HOUR", 2)
+    monkeypatch.setattr(reports, "REPORT_INTERVAL_HOURS", 168)
+    last_run = utc(2026, 10, 1, 2, 5)
+    assert reports.next_run_time(last_run, utc(2026, 10, 19, 14, 0)) == utc(2026, 10, 20, 2, 0)
+
+
+def test_backlog_is_reported_in_chunks_without_skipping_messages(database, monkeypatch):
+    monkeypatch.setattr(usage, "MAX_MESSAGES_TOKENS", 30)
+    add_messages(database, [f"message {i} " + "x" * 60 for i in range(5)])
+
+    prompts = []
+
+    async def run_batch(prompt):
+        prompts.append(prompt)
+        return f"report {len(prompts)}", []
+
+    asyncio.run(reports.ReportScheduler(run_batch).run_once())
+
+    covered = []
+    conn = sqlite3.connect(database)
+    rows = conn.execute(
+        "SELECT first_message_id, last_message_id FROM reports WHERE status = 'completed' ORDER BY id"
+    ).fetchall()
+    conn.close()
+    for first, last in rows:
+        covered.extend(range(first, last + 1))
+
+    assert covered == [1, 2, 3, 4, 5]
+    assert len(prompts) > 1
+    assert all(f"message {i} " in "".join(prompts) for i in range(5))
+    assert reports.get_checkpoint() == 5
+
+
+def test_trigger_refuses_while_a_manual_run_is_pending(database):
+    async def run_batch(prompt):
+        return "report", []
+
+    async def scenario():
+        scheduler = reports.ReportScheduler(run_batch)
+        assert scheduler.trigger() is True
+        assert scheduler.trigger() is False
+        await scheduler._manual_task
+        assert scheduler.trigger() is True
+        await scheduler.stop()
+        assert scheduler.trigger() is True
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_batch_runs_off_the_server_event_loop(database):
+    add_messages(database, ["noise in the office"])
+    batch_threads = []
+
+    async def run_batch(prompt):
+        batch_threads.append(threading.current_thread())
+        time.sleep(0.3)  # A sync tool call such as create_image
+        return "report", []
+
+    async def scenario():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        await reports.ReportScheduler(run_batch).run_once()
+        beat.cancel()
+        return ticks
+
+    ticks = asyncio.run(scenario())
+
+    assert batch_threads and batch_threads[0] is not threading.main_thread()
+    assert ticks >= 10
+
+
+@pytest.mark.parametrize("hours, period", [(168, "weekly"), (24, "daily"), (72, "3-day"), (12, "12-hour")])
+def test_prompt_names_the_configured_period(monkeypatch, hours, period):
+    monkeypatch.setattr(reports, "REPORT_INTERVAL_HOURS", hours)
+    prompt = reports.build_report_prompt([{"id": 1, "content": "hi"}], None, False)
+    assert prompt.startswith(f"Write the {period} 'state of feedback' report")
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, StaticAssetCache
+
+SCRIPT = "console.log('hello');\n" * 100
+
+
+def touch_later(path, seconds=10):
+    """Bump the mtime so the change is visible even on coarse-grained filesystems."""
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + seconds, stat.st_mtime + seconds))
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    directory = tmp_path / "static"
+    directory.mkdir()
+    (directory / "index.html").write_text(
+        '<html><script src="/static/app.js"></script>'
+        '<link href="/static/app.json?v=1"></html>'
+    )
+    (directory / "app.js").write_text(SCRIPT)
+    (directory / "app.json").write_text("{}")
+    return directory
+
+
+@pytest.fixture
+def cache(static_dir):
+    cache = StaticAssetCache(str(static_dir))
+    cache.load()
+    return cache
+
+
+@pytest.fixture
+def client(cache):
+    app = FastAPI()
+
+    @app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+    async def serve_static(path: str, request: Request):
+        asset, fingerprinted = cache.resolve(path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return cache.response(request, asset, immutable=fingerprinted)
+
+    return TestClient(app)
+
+
+def page_body(cache, name="index.html"):
+    return cache.get(name).variants["identity"][0].decode()
+
+
+def test_page_references_are_rewritten_to_whole_fingerprinted_urls(cache):
+    body = page_body(cache)
+    assert cache.url_for("app.js") in body
+    assert cache.url_for("app.json") + "?v=1" in body
+
+
+def test_gzip_is_negotiated(client):
+    response = client.get("/static/app.js", headers={"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == SCRIPT
+
+
+def test_encoding_with_q_zero_is_not_used(client):
+    response = client.get("/static/app.js", headers={"accept-encoding": "gzip;q=0, br;q=0"})
+    assert "content-encoding" not in response.headers
+    assert response.text == SCRIPT
+
+
+def test_if_none_match_returns_304(client):
+    first = client.get("/static/app.js")
+    second = client.get("/static/app.js", headers={"if-none-match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == b""
+
+
+def test_head_is_supported(client):
+    assert client.head("/static/app.js").status_code == 200
+
+
+@pytest.mark.parametrize("name", ["../secret.txt", "sub/../app.js", "/etc/passwd", "."])
+def test_paths_outside_or_unnormalized_are_rejected(cache, static_dir, name):
+    (static_dir.parent / "secret.txt").write_text("secret")
+    assert cache.resolve(name) == (None, False)
+
+
+def test_current_hash_is_immutable_and_stale_hash_revalidates(cache, client, static_dir):
+    current_url = cache.url_for("app.js")
+    response = client.get(current_url)
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    (static_dir / "app.js").write_text("console.log('changed');")
+    touch_later(static_dir / "app.js")
+
+    asset, fingerprinted = cache.resolve(current_url.rsplit("/", 1)[1])
+    assert asset.name == "app.js"
+    assert fingerprinted is False
+    assert client.get(current_url).headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+
+def test_page_picks_up_changed_asset_without_it_being_requested(cache, static_dir):
+    old_url = cache.url_for("app.js")
+    (static_dir / "app.js").write_text("console.log('changed');")
+    touch_later(static_dir / "app.js")
+
+    body = page_body(cache)
+    assert old_url not in body
+    assert cache.url_for("app.js") in body
+
+
+def test_files_added_after_startup_are_served(client, static_dir):
+    (static_dir / "late.css").write_text("body {}")
+    assert client.get("/static/late.css").status_code == 200
+
+
+def test_non_utf8_page_is_served_unrewritten(static_dir):
+    (static_dir / "latin1.html").write_bytes("<p>caf\xe9</p>".encode("latin-1"))
+    cache = StaticAssetCache(str(static_dir))
+    cache.load()
+    assert cache.get("latin1.html").variants["identity"][0] == "<p>caf\xe9</p>".encode("latin-1")
@@ -0,0 +1,128 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from hr_agent import usage
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "DATABASE_FILE", str(tmp_path / "messages.db"))
+    monkeypatch.setattr(usage, "_tables_ready", False)
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    monkeypatch.setattr(usage, "DAILY_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(usage, "DAILY_COST_BUDGET_USD", 1.0)
+    monkeypatch.setattr(usage, "DAILY_IMAGE_BUDGET", 10)
+    monkeypatch.setattr(usage, "SOFT_BUDGET_RATIO", 0.8)
+
+
+def daily(total_tokens=0, cost_usd=0.0, images=0):
+    return {"prompt_tokens": 0, "output_tokens": 0, "total_tokens": total_tokens,
+            "images": images, "cost_usd": cost_usd}
+
+
+def test_usage_is_aggregated_per_session_and_day(database):
+    metadata = SimpleNamespace(prompt_token_count=1000, candidates_token_count=200, total_token_count=1200)
+    usage.record_token_usage("s1", "gemini-2.0-flash", metadata)
+    usage.record_token_usage("s2", "gemini-2.0-flash", metadata)
+    usage.record_image_usage("s1", "imagen-4.0-generate-preview-06-06", 2)
+
+    session = usage.get_session_usage("s1")
+    assert session["total_tokens"] == 1200
+    assert session["images"] == 2
+    assert session["cost_usd"] == pytest.approx(0.00018 + 0.08)
+    assert usage.get_daily_usage()["total_tokens"] == 2400
+    assert len(usage.get_usage_history(7)) == 1
+
+
+@pytest.mark.parametrize("tokens, cost, low, exceeded", [
+    (0, 0.0, False, False),
+    (799, 0.0, False, False),
+    (800, 0.0, True, False),
+    (1000, 0.0, True, True),
+    (0, 0.8, True, False),
+    (0, 1.0, True, True),
+])
+def test_soft_and_hard_daily_thresholds(budgets, tokens, cost, low, exceeded):
+    assert usage.daily_budget_low(daily(tokens, cost)) is low
+    assert usage.daily_budget_exceeded(daily(tokens, cost)) is exceeded
+
+
+def test_zero_disables_a_budget(budgets, monkeypatch):
+    monkeypatch.setattr(usage, "DAILY_TOKEN_BUDGET", 0)
+    assert usage.daily_budget_exceeded(daily(total_tokens=10**9)) is False
+
+    monkeypatch.setattr(usage, "DAILY_IMAGE_BUDGET", 0)
+    assert usage.image_budget_remaining(daily(images=500)) == -1
+
+
+def test_image_budget_counts_down(budgets):
+    assert usage.image_budget_remaining(daily(images=3)) == 7
+    assert usage.image_budget_remaining(daily(images=12)) == 0
+
+
+def test_cost_budget_refuses_images_even_when_image_budget_is_disabled(budgets, monkeypatch):
+    monkeypatch.setattr(usage, "DAILY_IMAGE_BUDGET", 0)
+    assert usage.image_budget_remaining(daily(cost_usd=100)) == 0
+
+    monkeypatch.setattr(usage, "DAILY_IMAGE_BUDGET", 10)
+    assert usage.image_budget_remaining(daily(cost_usd=0.8)) == 0
+
+
+def test_fit_messages_passes_small_lists_through(database, budgets):
+    messages = [{"content": "short"}] * 3
+    assert usage.fit_messages(messages) == messages
+
+
+def test_fit_messages_digests_large_lists(database, budgets, monkeypatch):
+    monkeypatch.setattr(usage, "MAX_MESSAGES_TOKENS", 100)
+    messages = [{"content": f"{i} " + "x" * 500} for i in range(300)]
+
+    digest = usage.fit_messages(messages)
+
+    assert len(digest) == usage.DIGEST_MESSAGE_COUNT + 1
+    assert "100 older messages omitted" in digest[0]["content"]
+    assert digest[-1]["content"].startswith("299 ")
+    assert all(len(m["content"]) <= usage.DIGEST_MESSAGE_CHARS + 1 for m in digest[1:])
+
+
+def test_fit_messages_digests_when_budget_is_low(database, budgets, monkeypatch):
+    monkeypatch.setattr(usage, "get_daily_usage", lambda day=None: daily(total_tokens=900))
+    messages = [{"content": "x" * 1000}]
+    assert usage.fit_messages(messages) == [{"content": "x" * usage.DIGEST_MESSAGE_CHARS + "…"}]
+
+
+def test_estimate_events_tokens_counts_text_and_tool_traffic():
+    events = [
+        SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text="a" * 400)])),
+        SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(
+            text=None, function_call=SimpleNamespace(args={"prompt": "p" * 40}))])),
+        SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(
+            text=None, function_call=None, function_response=None)])),
+        SimpleNamespace(content=None),
+    ]
+    expected = usage.estimate_tokens("a" * 400) + usage.estimate_tokens(json.dumps({"prompt": "p" * 40}))
+    assert usage.estimate_events_tokens(events) == expected
+
+
+def test_projected_turn_reserves_room_for_overhead_and_message_listing(monkeypatch):
+    monkeypatch.setattr(usage, "MAX_MESSAGES_TOKENS", 50_000)
+
+    def list_submitted_messages():
+        """Retrieves the full list of worker-submitted messages."""
+
+    overhead = usage.estimate_agent_overhead("instruction " * 100, [list_submitted_messages])
+    assert overhead > usage.estimate_tokens("instruction " * 100) + usage.TOOL_DECLARATION_TOKENS
+
+    projected = usage.projected_turn_tokens([], "hello", overhead)
+    assert projected == overhead + usage.estimate_tokens("hello") + 50_000
+
+
+def test_headroom_covers_the_digest_when_the_limit_is_small(monkeypatch):
+    monkeypatch.setattr(usage, "MAX_MESSAGES_TOKENS", 10)
+    digest = usage.digest_messages([{"content": "x" * 1000}] * 1000)
+    assert usage.messages_headroom_tokens() >= usage.estimate_tokens(json.dumps(digest))